@@ -1,11 +1,25 @@
-"""Convert ROS 2 bag files to CSV format, creating one CSV file per topic."""
+"""Convert ROS 2 bag files to CSV (or Parquet) format, creating one file per topic."""
 
 import argparse
+import atexit
+import contextlib
+import csv
+import io
+import multiprocessing
+import operator
 import os
+import queue
+import re
+import struct
 import sys
+import tempfile
+import threading
 from pathlib import Path
 
+import yaml
 from rclpy.serialization import deserialize_message
+from rosidl_parser.definition import Array, BasicType, NamespacedType
+from rosidl_runtime_py.import_message import import_message_from_namespaced_type
 from rosidl_runtime_py.utilities import get_message
 
 # This is needed on Linux when compiling with clang/libc++.
@@ -16,10 +30,111 @@ if os.environ.get('ROSBAG2_PY_TEST_WITH_RTLD_GLOBAL') is not None:
 
 import rosbag2_py  # noqa: E402
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Only needed for --format parquet
+    pa = pq = None
+
+# Rows buffered per topic before they are formatted
+CSV_BATCH_ROWS = 1000
+
+# Formatted CSV bytes buffered per topic before they are written to the file
+CSV_WRITE_BUFFER_BYTES = 1 << 20
+
+# Rows buffered per topic before writing them as one Parquet record batch
+PARQUET_BATCH_ROWS = 65536
+
+# Messages between two progress lines
+PROGRESS_INTERVAL = 1000
+
+# Messages handed over at once by the reader thread, and batches it may queue ahead
+READ_BATCH_SIZE = 256
+READ_QUEUE_BATCHES = 16
+
+# Storage plugins whose bags can be converted
+STORAGE_IDS = {"sqlite3", "mcap"}
+
+# SQLite pragmas applied when reading bags. Bags are only ever opened read-only,
+# so trading durability for throughput is safe: 256 MiB page cache, memory-mapped
+# reads and in-memory temporary tables.
+SQLITE_READ_CONFIG = """\
+read:
+  pragmas: ["cache_size=-262144", "mmap_size=4294967296", "temp_store=MEMORY"]
+"""
+
+# Upper bound of the default --jobs. Every job opens its own bag with the page
+# cache and memory map above, so the default stays low on many-core machines.
+MAX_DEFAULT_JOBS = 4
+
+_sqlite_config_path = None
+
+
+def _get_sqlite_config_uri():
+    """Get the path of the sqlite3 storage config file, writing it on first use.
+    
+    Returns:
+        Path to a temporary YAML file containing SQLITE_READ_CONFIG.
+    """
+    global _sqlite_config_path
+    if _sqlite_config_path is None:
+        fd, _sqlite_config_path = tempfile.mkstemp(prefix="rosbag_to_csv_", suffix=".yaml")
+        with os.fdopen(fd, "w") as file:
+            file.write(SQLITE_READ_CONFIG)
+        atexit.register(os.remove, _sqlite_config_path)
+    return _sqlite_config_path
+
+
+# Parsed bag metadata keyed by normalized directory path, see _read_bag_metadata()
+_metadata_cache = {}
+
+# Use the libyaml parser when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _read_bag_metadata(path):
+    """Read the bag information from the metadata.yaml of a directory.
+    
+    Results are cached per directory, so finding bags and opening them later
+    parses each metadata.yaml only once.
+    
+    Args:
+        path: Path to the directory.
+    
+    Returns:
+        Dict of the rosbag2_bagfile_information section, or None if the
+        directory has no valid metadata.yaml.
+    """
+    key = os.path.normpath(path)
+    if key not in _metadata_cache:
+        try:
+            with open(os.path.join(key, "metadata.yaml")) as file:
+                metadata = yaml.load(file, Loader=_YAML_LOADER)["rosbag2_bagfile_information"]
+        except (OSError, yaml.YAMLError, KeyError, TypeError):
+            metadata = None
+        _metadata_cache[key] = metadata if isinstance(metadata, dict) else None
+    return _metadata_cache[key]
+
+
+def _get_storage_id(path):
+    """Get the storage plugin a ROS bag was recorded with from its metadata.yaml.
+    
+    Args:
+        path: Path to the ROS bag directory.
+    
+    Returns:
+        Storage identifier such as 'sqlite3' or 'mcap', or '' if it is unknown.
+    """
+    metadata = _read_bag_metadata(path)
+    return metadata.get("storage_identifier", "") if metadata else ""
+
 
 def get_rosbag_options(path, serialization_format='cdr'):
     """Create storage and converter options for reading a ROS bag.
     
+    The storage plugin is the one the bag was recorded with, left empty for
+    rosbag2 to detect if metadata.yaml does not name it.
+    
     Args:
         path: Path to the ROS bag directory.
         serialization_format: Message serialization format (default: 'cdr').
@@ -27,7 +142,11 @@ def get_rosbag_options(path, serialization_format='cdr'):
     Returns:
         Tuple of (storage_options, converter_options).
     """
-    storage_options = rosbag2_py.StorageOptions(uri=path, storage_id='sqlite3')
+    storage_id = _get_storage_id(path)
+    # The read pragmas only apply to the sqlite3 plugin
+    storage_config_uri = _get_sqlite_config_uri() if storage_id == 'sqlite3' else ''
+    storage_options = rosbag2_py.StorageOptions(
+        uri=path, storage_id=storage_id, storage_config_uri=storage_config_uri)
     converter_options = rosbag2_py.ConverterOptions(
         input_serialization_format=serialization_format,
         output_serialization_format=serialization_format
@@ -61,13 +180,677 @@ def _gen_msg_values(msg, prefix=""):
         yield prefix, msg
 
 
-def dump_bag(bag_path, output_path):
-    """Convert ROS bag to CSV files, one per topic.
+# Compiled flatteners keyed by (message class, skip_header, raw, fields), see _get_flattener()
+_flattener_cache = {}
+
+# Name of the CSV formatter bound in the generated flatteners for each ROS primitive type.
+# Strings are passed through unchanged, anything not listed here falls back to str().
+_itoa = str
+_BOOL_STR = ("0", "1")
+_FORMATTERS = {
+    "float": "repr",
+    "double": "repr",
+    "boolean": "_format_bool",
+    **{t: "_itoa" for t in ("int8", "uint8", "int16", "uint16",
+                            "int32", "uint32", "int64", "uint64")},
+}
+
+# Callable behind each formatter name above, bound as globals of the generated flatteners
+_FORMATTER_GLOBALS = {
+    "repr": repr,
+    "str": str,
+    "_itoa": _itoa,
+    "_format_bool": _BOOL_STR.__getitem__,
+}
+
+# Formatter of the CSV time column
+_format_time = "{:.9f}".format
+
+# Bytes %-format codes of the numeric ROS primitive types, used to format
+# whole CSV lines of numeric topics with a single template
+_LINE_FORMAT_CODES = {
+    "float": "%r",
+    "double": "%r",
+    "boolean": "%d",
+    **{t: "%d" for t in ("int8", "uint8", "int16", "uint16",
+                         "int32", "uint32", "int64", "uint64")},
+}
+
+# Element types of the fixed-size arrays rosidl stores as numpy arrays. Those are
+# kept as a single value; arrays of any other type are Python lists and are
+# expanded element by element like sequences.
+_NUMPY_ARRAY_TYPES = {"float", "double", "int8", "uint8", "int16", "uint16",
+                      "int32", "uint32", "int64", "uint64"}
+
+
+def _is_numpy_array(slot_type):
+    """Check whether a field is a fixed-size array stored as a numpy array.
+    
+    Args:
+        slot_type: rosidl_parser type of the field.
+    
+    Returns:
+        True for fixed-size arrays of numeric primitives.
+    """
+    return (isinstance(slot_type, Array) and isinstance(slot_type.value_type, BasicType)
+            and slot_type.value_type.typename in _NUMPY_ARRAY_TYPES)
+
+
+def _formatter_name(slot_type):
+    """Get the name of the formatter for a primitive field.
+    
+    Args:
+        slot_type: rosidl_parser type of the field.
+    
+    Returns:
+        Formatter name to call in generated code, or None for strings.
+    """
+    if isinstance(slot_type, BasicType):
+        return _FORMATTERS.get(slot_type.typename, "str")
+    return None
+
+
+def _select_field(keep, field):
+    """Narrow a field whitelist down to one field of a message.
+    
+    Args:
+        keep: Set of dotted field paths relative to the message, or None for all fields.
+        field: Name of the field.
+    
+    Returns:
+        None if the whole field is selected, otherwise the set of paths selected
+        inside it, which is empty if the field is not selected at all.
+    """
+    if keep is None or field in keep:
+        return None
+    prefix = field + "."
+    return frozenset(path[len(prefix):] for path in keep if path.startswith(prefix))
+
+
+def _check_fields(msg_cls, fields):
+    """Check that every path of a field whitelist names a field of a message type.
+    
+    Args:
+        msg_cls: ROS message class.
+        fields: Set of dotted field paths without indices.
+    
+    Raises:
+        ValueError: If the whitelist is empty, a path does not name a field of
+            msg_cls or of the messages nested in it, or it names a field of the
+            top-level header, which is never written.
+    """
+    if not fields:
+        raise ValueError(f"No fields of {msg_cls.__name__} selected")
+    has_header = "header" in msg_cls.get_fields_and_field_types()
+    for path in fields:
+        if has_header and path.split(".", 1)[0] == "header":
+            raise ValueError(f"Header fields of {msg_cls.__name__} are not written, "
+                             f"its stamp is the time column: '{path}'")
+        cls = msg_cls
+        for name in path.split("."):
+            slot_types = dict(zip(cls.get_fields_and_field_types(), cls.SLOT_TYPES)) if cls else {}
+            if name not in slot_types:
+                raise ValueError(f"{msg_cls.__name__} has no field '{path}'")
+            value_type = getattr(slot_types[name], "value_type", slot_types[name])
+            cls = (import_message_from_namespaced_type(value_type)
+                   if isinstance(value_type, NamespacedType) else None)
+
+
+def _field_selected(name, fields):
+    """Check whether a flattened field name is selected by a field whitelist.
+    
+    Args:
+        name: Field name as yielded by _gen_msg_values(), e.g. 'points[2].x'.
+        fields: Set of dotted field paths without indices, or None for all fields.
+    
+    Returns:
+        True if the field or one of its parents is in the whitelist.
+    """
+    if fields is None:
+        return True
+    path = re.sub(r"\[\d+\]", "", name)
+    return any(path == field or path.startswith(field + ".") for field in fields)
+
+
+def _gen_columns(msg, fields=None):
+    """Get the output columns of a topic, leaving out header fields.
+    
+    Args:
+        msg: First message of the topic.
+        fields: Set of dotted field paths to keep, or None for all fields.
+    
+    Yields:
+        Tuples of (field_name, slot_type) in flattener order.
+    """
+    for (field, _), slot_type in zip(_gen_msg_values(msg), _gen_slot_types(msg)):
+        if not field.startswith("header.") and _field_selected(field, fields):
+            yield field, slot_type
+
+
+def _column_formatter(slot_type):
+    """Get the CSV formatter for a column of primitive values.
+    
+    Args:
+        slot_type: rosidl_parser type of the field.
+    
+    Returns:
+        Callable converting one value to its CSV string, or None for strings.
+    """
+    if isinstance(slot_type, Array):
+        return str
+    name = _formatter_name(slot_type)
+    return _FORMATTER_GLOBALS[name] if name else None
+
+
+def _is_fixed_width(msg_cls, keep=None):
+    """Check whether every message of a type flattens to the same number of values.
+    
+    Args:
+        msg_cls: ROS message class.
+        keep: Set of dotted field paths to keep, or None for all fields.
+    
+    Returns:
+        True if no selected field is a sequence, including in nested messages.
+    """
+    fields = msg_cls.get_fields_and_field_types()
+    for (field, field_type), slot_type in zip(fields.items(), msg_cls.SLOT_TYPES):
+        sub_keep = _select_field(keep, field)
+        value_type = getattr(slot_type, "value_type", slot_type)
+        if isinstance(value_type, NamespacedType):
+            if sub_keep is not None and not sub_keep:
+                continue
+            if field_type.startswith("sequence<") or not _is_fixed_width(
+                    import_message_from_namespaced_type(value_type), sub_keep):
+                return False
+        elif sub_keep is None and field_type.startswith("sequence<"):
+            return False
+    return True
+
+
+# struct codes of the ROS primitive types that can be decoded straight from CDR
+_CDR_FORMATS = {
+    "boolean": "?", "int8": "b", "uint8": "B", "int16": "h", "uint16": "H",
+    "int32": "i", "uint32": "I", "int64": "q", "uint64": "Q", "float": "f", "double": "d",
+}
+
+# Encapsulation header of little-endian plain CDR payloads
+_CDR_LE_HEADER = b"\x00\x01"
+
+
+def _cdr_format(msg_cls, offset=0, keep=None):
+    """Build the struct format of a message made only of fixed-size primitive fields.
+    
+    Every primitive is aligned to its own size relative to the start of the
+    CDR payload, which follows the 4-byte encapsulation header. Fields that
+    are not selected are skipped as padding bytes.
+    
+    Args:
+        msg_cls: ROS message class.
+        offset: Payload offset the message starts at.
+        keep: Set of dotted field paths to unpack, or None for all fields.
+    
+    Returns:
+        Tuple of (format, end offset), or None if the message has strings,
+        sequences, arrays or other types not supported by the fast path.
+    """
+    fmt = ""
+    for field, slot_type in zip(msg_cls.get_fields_and_field_types(), msg_cls.SLOT_TYPES):
+        sub_keep = _select_field(keep, field)
+        if isinstance(slot_type, NamespacedType):
+            nested = _cdr_format(import_message_from_namespaced_type(slot_type), offset, sub_keep)
+            if nested is None:
+                return None
+            nested_fmt, offset = nested
+            fmt += nested_fmt
+        elif isinstance(slot_type, BasicType) and slot_type.typename in _CDR_FORMATS:
+            code = _CDR_FORMATS[slot_type.typename]
+            size = struct.calcsize(code)
+            padding = -offset % size
+            if sub_keep is not None:
+                fmt += f"{padding + size}x"
+            else:
+                fmt += f"{padding}x{code}" if padding else code
+            offset += padding + size
+        else:
+            return None
+    return fmt, offset
+
+
+def _get_cdr_struct(msg_cls, fields=None):
+    """Get a struct decoding little-endian CDR payloads of a flat message type.
+    
+    Args:
+        msg_cls: ROS message class.
+        fields: Set of dotted field paths to unpack, or None for all fields.
+    
+    Returns:
+        struct.Struct unpacking the fields in flattener order, or None if the
+        type has to go through deserialize_message().
+    """
+    cdr = _cdr_format(msg_cls, keep=fields)
+    return struct.Struct("<" + cdr[0]) if cdr else None
+
+
+def _gen_slot_types(msg):
+    """Recursively get the rosidl type of each primitive field of a ROS message.
+    
+    Args:
+        msg: ROS message object.
+    
+    Yields:
+        rosidl_parser type of each field, in the same order as _gen_msg_values().
+    """
+    fields = msg.get_fields_and_field_types()
+    for (field, field_type), slot_type in zip(fields.items(), msg.SLOT_TYPES):
+        val = getattr(msg, field)
+        if field_type.startswith("sequence<") or (
+                isinstance(slot_type, Array) and not _is_numpy_array(slot_type)):
+            for array_val in val:
+                if isinstance(slot_type.value_type, NamespacedType):
+                    yield from _gen_slot_types(array_val)
+                else:
+                    yield slot_type.value_type
+        elif isinstance(slot_type, NamespacedType):
+            yield from _gen_slot_types(val)
+        else:
+            yield slot_type
+
+
+def _flattener_exprs(msg_cls, ref, namespace, skip=(), raw=False, keep=None):
+    """Build the Python expressions that format every primitive field of a message.
+    
+    The expressions follow the same traversal order as _gen_msg_values(), so
+    the values they produce line up with the field names it yields. Each value
+    is converted to its CSV string with a formatter chosen from the field type,
+    unless raw values are requested.
+    
+    Args:
+        msg_cls: ROS message class to walk.
+        ref: Source expression referring to the message instance.
+        namespace: Globals of the generated function, nested flatteners are added here.
+        skip: Names of fields of msg_cls to leave out.
+        raw: Return the field values as they are instead of CSV strings.
+        keep: Set of dotted field paths to keep, or None for all fields.
+    
+    Returns:
+        List of expression strings, sequence fields are emitted as starred expressions.
+    """
+    exprs = []
+    fields = msg_cls.get_fields_and_field_types()
+    for (field, field_type), slot_type in zip(fields.items(), msg_cls.SLOT_TYPES):
+        if field in skip:
+            continue
+        sub_keep = _select_field(keep, field)
+        value_type = getattr(slot_type, "value_type", slot_type)
+        if isinstance(value_type, NamespacedType):
+            if sub_keep is not None and not sub_keep:
+                continue
+        elif sub_keep is not None:
+            continue
+        attr = f"{ref}.{field}"
+        if _is_numpy_array(slot_type):
+            # Numeric fixed-size arrays are kept as a single value
+            exprs.append(attr if raw else f"str({attr})")
+        elif field_type.startswith("sequence<") or isinstance(slot_type, Array):
+            if isinstance(value_type, NamespacedType):
+                # Variable number of nested messages, flatten each one in a local loop
+                name = f"_flatten_{len(namespace)}"
+                namespace[name] = _get_flattener(
+                    import_message_from_namespaced_type(value_type), raw=raw, fields=sub_keep)
+                exprs.append(f"*[v for e in {attr} for v in {name}(e)]")
+            else:
+                formatter = None if raw else _formatter_name(value_type)
+                exprs.append(f"*map({formatter}, {attr})" if formatter else f"*{attr}")
+        elif isinstance(slot_type, NamespacedType):
+            exprs.extend(_flattener_exprs(
+                import_message_from_namespaced_type(slot_type), attr, namespace,
+                raw=raw, keep=sub_keep))
+        else:
+            formatter = None if raw else _formatter_name(slot_type)
+            exprs.append(f"{formatter}({attr})" if formatter else attr)
+    return exprs
+
+
+def _get_flattener(msg_cls, skip_header=False, raw=False, fields=None):
+    """Get a function returning the primitive values of a message as a flat list.
+    
+    The values are CSV strings, or the field values as they are if raw is set.
+    
+    The function is generated and compiled once per message class, so the
+    per-message cost is a single straight-line list of attribute lookups.
+    
+    Args:
+        msg_cls: ROS message class.
+        skip_header: Leave out the top-level header field.
+        raw: Return the field values as they are instead of CSV strings.
+        fields: Set of dotted field paths to keep, or None for all fields.
+    
+    Returns:
+        Callable taking a message instance and returning a list of values.
+    """
+    key = (msg_cls, skip_header, raw, fields)
+    flattener = _flattener_cache.get(key)
+    if flattener is None:
+        namespace = dict(_FORMATTER_GLOBALS)
+        skip = ("header",) if skip_header else ()
+        exprs = _flattener_exprs(msg_cls, "m", namespace, skip, raw, fields)
+        source = f"def flatten(m):\n    return [{', '.join(exprs)}]\n"
+        exec(compile(source, f"<flatten {msg_cls.__name__}>", "exec"), namespace)
+        flattener = _flattener_cache[key] = namespace["flatten"]
+    return flattener
+
+
+def _read_messages(reader):
+    """Read all messages of a bag in a background thread.
+    
+    Reading the bag overlaps with converting the messages in the caller. The
+    thread hands messages over in batches of READ_BATCH_SIZE through a bounded
+    queue. If the caller stops early, the thread is stopped before returning
+    so the reader is no longer in use.
+    
+    Args:
+        reader: Opened rosbag2_py reader.
+    
+    Yields:
+        Tuples of (topic, data, timestamp) in bag order.
+    """
+    batches = queue.Queue(READ_QUEUE_BATCHES)
+    stop = threading.Event()
+    errors = []
+
+    def produce():
+        try:
+            batch = []
+            while not stop.is_set() and reader.has_next():
+                batch.append(reader.read_next())
+                if len(batch) >= READ_BATCH_SIZE:
+                    batches.put(batch)
+                    batch = []
+            if batch:
+                batches.put(batch)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            batches.put(None)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    batch = []
+    try:
+        while (batch := batches.get()) is not None:
+            yield from batch
+    finally:
+        if batch is not None:
+            # Stopped early, drain the queue so a blocked put() returns and the thread exits
+            stop.set()
+            while batches.get() is not None:
+                pass
+        thread.join()
+    
+    if errors:
+        raise errors[0]
+
+
+class _CsvTopicWriter:
+    """Write the messages of one topic to a CSV file, in batches of CSV_BATCH_ROWS rows.
+    
+    When every message of the type has the same number of fields, rows are
+    buffered with their raw values. Rows of only numeric fields are formatted
+    by a single bytes template per line, other rows go through csv.writer a
+    whole column at a time so strings are quoted. When the number of fields
+    varies, each row is formatted by the flattener.
+    """
+
+    extension = ".csv"
+
+    def __init__(self, path, msg, fields=None):
+        """Create the CSV file and write its header.
+        
+        Args:
+            path: Output file path.
+            msg: First message of the topic, used to name the columns.
+            fields: Set of dotted field paths to write, or None for all fields.
+        """
+        # Unbuffered file, writes are coalesced in self.buffer instead
+        self.file = open(path, "wb", buffering=0)
+        self.buffer = bytearray()
+        # csv.writer output is collected as text and encoded once per batch
+        self.text = io.StringIO()
+        self.writer = csv.writer(self.text, lineterminator="\n")
+        self.rows = []
+        
+        names = []
+        formatters = [_format_time]
+        codes = ["%.9f"]
+        for field, slot_type in _gen_columns(msg, fields):
+            names.append(field)
+            formatters.append(_column_formatter(slot_type))
+            codes.append(_LINE_FORMAT_CODES.get(getattr(slot_type, "typename", None)))
+        self.writer.writerow(["time"] + names)
+        self._write_text()
+        
+        self.line_format = None
+        self.formatters = None
+        if _is_fixed_width(type(msg), fields):
+            self.flattener = _get_flattener(type(msg), skip_header=True, raw=True, fields=fields)
+            if None in codes:
+                self.formatters = formatters
+            else:
+                self.line_format = (",".join(codes) + "\n").encode().__mod__
+        else:
+            self.flattener = _get_flattener(type(msg), skip_header=True, fields=fields)
+
+    def write(self, relative_time, values):
+        """Add one message as a row.
+        
+        Args:
+            relative_time: Message time relative to the start of the bag, in seconds.
+            values: Field values of the message, as returned by self.flattener.
+        """
+        rows = self.rows
+        rows.append((relative_time, *values))
+        if len(rows) >= CSV_BATCH_ROWS:
+            self._flush()
+
+    def _write_text(self):
+        """Encode the csv.writer output collected so far into the output buffer."""
+        self.buffer += self.text.getvalue().encode()
+        self.text.seek(0)
+        self.text.truncate()
+
+    def _write_buffer(self):
+        """Write the whole output buffer to the file."""
+        view = memoryview(self.buffer)
+        while view:
+            view = view[self.file.write(view):]
+        del view
+        self.buffer.clear()
+
+    def _flush(self):
+        """Format the buffered rows into the output buffer, writing it once it is full."""
+        rows = self.rows
+        if self.line_format is not None:
+            self.buffer += b"".join(map(self.line_format, rows))
+        else:
+            if self.formatters is None:
+                self.writer.writerows((_format_time(row[0]), *row[1:]) for row in rows)
+            else:
+                columns = [column if formatter is None else map(formatter, column)
+                           for formatter, column in zip(self.formatters, zip(*rows))]
+                self.writer.writerows(zip(*columns))
+            self._write_text()
+        rows.clear()
+        if len(self.buffer) >= CSV_WRITE_BUFFER_BYTES:
+            self._write_buffer()
+
+    def close(self):
+        """Write the remaining rows and close the file."""
+        self._flush()
+        self._write_buffer()
+        self.file.close()
+
+
+def _arrow_type(slot_type):
+    """Get the Arrow type matching a primitive ROS field.
+    
+    Args:
+        slot_type: rosidl_parser type of the field.
+    
+    Returns:
+        pyarrow DataType.
+    """
+    if isinstance(slot_type, Array):
+        return pa.list_(_arrow_type(slot_type.value_type))
+    if isinstance(slot_type, BasicType):
+        return {
+            "float": pa.float32(), "double": pa.float64(), "long double": pa.float64(),
+            "boolean": pa.bool_(), "octet": pa.binary(), "char": pa.string(), "wchar": pa.string(),
+            "int8": pa.int8(), "uint8": pa.uint8(), "int16": pa.int16(), "uint16": pa.uint16(),
+            "int32": pa.int32(), "uint32": pa.uint32(), "int64": pa.int64(), "uint64": pa.uint64(),
+        }[slot_type.typename]
+    # Strings, bounded or not, are the only other primitive fields
+    return pa.string()
+
+
+def _arrow_columns(msg_cls, ref, prefix="", keep=None, skip=(), depth=0):
+    """Build the Parquet columns of every primitive field of a message.
+    
+    Sequences become list columns, so every message has the same columns
+    whatever the length of its sequences. Each field of a sequence of messages
+    gets its own list column, nested once more per enclosing sequence.
+    Fixed-size arrays that are not numpy arrays are expanded element by
+    element, like in the CSV output.
+    
+    Args:
+        msg_cls: ROS message class to walk.
+        ref: Source expression referring to the message instance.
+        prefix: Column name prefix of the fields of msg_cls.
+        keep: Set of dotted field paths to keep, or None for all fields.
+        skip: Names of fields of msg_cls to leave out.
+        depth: Number of enclosing sequences, used to name loop variables.
+    
+    Yields:
+        Tuples of (column name, pyarrow DataType, source expression of the value).
+    """
+    fields = msg_cls.get_fields_and_field_types()
+    for (field, field_type), slot_type in zip(fields.items(), msg_cls.SLOT_TYPES):
+        if field in skip:
+            continue
+        sub_keep = _select_field(keep, field)
+        value_type = getattr(slot_type, "value_type", slot_type)
+        if isinstance(value_type, NamespacedType):
+            if sub_keep is not None and not sub_keep:
+                continue
+            value_cls = import_message_from_namespaced_type(value_type)
+        elif sub_keep is not None:
+            continue
+        name = prefix + field
+        attr = f"{ref}.{field}"
+        if field_type.startswith("sequence<"):
+            if isinstance(value_type, NamespacedType):
+                var = f"e{depth}"
+                for column, arrow_type, expr in _arrow_columns(
+                        value_cls, var, name + ".", sub_keep, depth=depth + 1):
+                    yield column, pa.list_(arrow_type), f"[{expr} for {var} in {attr}]"
+            else:
+                yield name, pa.list_(_arrow_type(value_type)), attr
+        elif isinstance(slot_type, Array) and not _is_numpy_array(slot_type):
+            for i in range(slot_type.size):
+                if isinstance(value_type, NamespacedType):
+                    yield from _arrow_columns(
+                        value_cls, f"{attr}[{i}]", f"{name}[{i}].", sub_keep, depth=depth)
+                else:
+                    yield f"{name}[{i}]", _arrow_type(value_type), f"{attr}[{i}]"
+        elif isinstance(slot_type, NamespacedType):
+            yield from _arrow_columns(value_cls, attr, name + ".", sub_keep, depth=depth)
+        else:
+            yield name, _arrow_type(slot_type), attr
+
+
+class _ParquetTopicWriter:
+    """Write the messages of one topic to a Parquet file, accumulating typed columns."""
+
+    extension = ".parquet"
+
+    def __init__(self, path, msg, fields=None):
+        """Build the schema of the topic and open the file.
+        
+        The columns only depend on the message type, sequences are written as
+        list columns, see _arrow_columns().
+        
+        Args:
+            path: Output file path.
+            msg: First message of the topic, used to get its type.
+            fields: Set of dotted field paths to write, or None for all fields.
+        """
+        msg_cls = type(msg)
+        columns = list(_arrow_columns(msg_cls, "m", keep=fields, skip=("header",)))
+        namespace = {}
+        source = f"def flatten(m):\n    return [{', '.join(expr for *_, expr in columns)}]\n"
+        exec(compile(source, f"<flatten {msg_cls.__name__}>", "exec"), namespace)
+        self.flattener = namespace["flatten"]
+        
+        self.schema = pa.schema([("time", pa.float64())] + [
+            (name, arrow_type) for name, arrow_type, _ in columns])
+        self.columns = [[] for _ in self.schema]
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, relative_time, values):
+        """Add one message as a row.
+        
+        Args:
+            relative_time: Message time relative to the start of the bag, in seconds.
+            values: Field values of the message, as returned by self.flattener.
+        """
+        columns = self.columns
+        columns[0].append(relative_time)
+        for column, value in zip(columns[1:], values):
+            column.append(value)
+        if len(columns[0]) >= PARQUET_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        """Write the buffered columns as one record batch."""
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type)
+             for column, field in zip(self.columns, self.schema)],
+            schema=self.schema)
+        self.writer.write_batch(batch)
+        for column in self.columns:
+            column.clear()
+
+    def close(self):
+        """Write the remaining rows and close the file."""
+        if self.columns[0]:
+            self._flush()
+        self.writer.close()
+
+
+_TOPIC_WRITERS = {
+    "csv": _CsvTopicWriter,
+    "parquet": _ParquetTopicWriter,
+}
+
+
+def dump_bag(bag_path, output_path, output_format="csv", fields=None, progress=True):
+    """Convert ROS bag to CSV (or Parquet) files, one per topic.
     
     Args:
         bag_path: Path to the ROS bag directory.
-        output_path: Path where CSV files will be saved.
+        output_path: Path where the files will be saved.
+        output_format: Output file format, one of _TOPIC_WRITERS.
+        fields: Dict mapping topic names to the set of dotted field paths to write.
+            Topics not in the dict are written with all their fields.
+        progress: Print the bag time every PROGRESS_INTERVAL messages.
+    
+    Raises:
+        ValueError: If the fields of a topic do not match its message type. This
+            is checked before any message is read.
     """
+    # Field sets are part of the flattener cache keys, so they have to be hashable
+    fields = {topic: frozenset(paths) for topic, paths in (fields or {}).items()}
+    topic_writer = _TOPIC_WRITERS[output_format]
+
     storage_options, converter_options = get_rosbag_options(bag_path)
 
     reader = rosbag2_py.SequentialReader()
@@ -77,66 +860,100 @@ def dump_bag(bag_path, output_path):
 
     # Create a map for quicker lookup
     type_map = {topic.name: topic.type for topic in topic_types}
+    
+    # Check the field selection before any output is written
+    for topic, topic_fields in fields.items():
+        if topic in type_map:
+            _check_fields(get_message(type_map[topic]), topic_fields)
+        else:
+            print(f"  Warning: topic '{topic}' of the field selection is not in {bag_path}",
+                  file=sys.stderr)
 
     file_map = {}
     start_time = None
-    msg_count = 0
+    # Countdown to the next progress line, starting with the first message.
+    # Counting down from -1 never reaches zero, which turns progress off.
+    next_tick = 1 if progress else -1
     
     SKIP_TOPICS = {"/rosout", "/parameter_events"}
     
     # Ensure output directory exists
     os.makedirs(output_path, exist_ok=True)
     
-    while reader.has_next():
-        topic, data, timestamp = reader.read_next()
-        
-        if topic in SKIP_TOPICS:
-            continue
+    # Stop the reader thread and write out every file opened so far, also if conversion fails
+    with contextlib.ExitStack() as stack:
+        messages = stack.enter_context(contextlib.closing(_read_messages(reader)))
+        for topic, data, timestamp in messages:
+            if topic in SKIP_TOPICS:
+                continue
             
-        msg_type = get_message(type_map[topic])
-        msg = deserialize_message(data, msg_type)
-
-        # Create CSV file for new topic
-        if topic not in file_map:
-            csv_filename = f"{output_path}/{topic.lstrip('/').replace('/', '_')}.csv"
-            file = open(csv_filename, "w")
+            if topic not in file_map:
+                # Resolve the message type and create the output file once per topic
+                msg_type = get_message(type_map[topic])
+                filename = f"{output_path}/{topic.lstrip('/').replace('/', '_')}{topic_writer.extension}"
+                topic_fields = fields.get(topic)
+                writer = topic_writer(filename, deserialize_message(data, msg_type), topic_fields)
+                stack.callback(writer.close)
+                if "header" in msg_type.get_fields_and_field_types():
+                    stamp_getter = operator.attrgetter("header.stamp.sec", "header.stamp.nanosec")
+                else:
+                    stamp_getter = None
+                # Flat types are fixed width, so their writers take raw values too
+                cdr_struct = _get_cdr_struct(msg_type, topic_fields)
+                file_map[topic] = (writer, writer.flattener, stamp_getter, msg_type, cdr_struct)
             
-            fields = [field for field, _ in _gen_msg_values(msg)
-                      if not field.startswith("header.")]
-            print("time," + ",".join(fields), file=file)
-            file_map[topic] = file
-
-        file = file_map[topic]
-        
-        # Extract timestamp from message header if available, otherwise use bag timestamp
-        if hasattr(msg, "header"):
-            time_sec = msg.header.stamp.sec + 1e-9 * msg.header.stamp.nanosec
-        else:
-            time_sec = timestamp
+            writer, flattener, stamp_getter, msg_type, cdr_struct = file_map[topic]
             
-        if start_time is None:
-            start_time = time_sec
+            if cdr_struct is not None and data[:2] == _CDR_LE_HEADER:
+                # Flat message, decode the fields straight from the CDR payload
+                values = cdr_struct.unpack_from(data, 4)
+                time_sec = 1e-9 * timestamp
+            else:
+                msg = deserialize_message(data, msg_type)
+                values = flattener(msg)
+                
+                # Extract timestamp from message header if available, otherwise use bag timestamp
+                if stamp_getter:
+                    sec, nanosec = stamp_getter(msg)
+                    time_sec = sec + 1e-9 * nanosec
+                else:
+                    # Bag timestamps are in nanoseconds
+                    time_sec = 1e-9 * timestamp
             
-        relative_time = time_sec - start_time
-        values = [str(val) for _, val in _gen_msg_values(msg)
-                  if not _.startswith("header.")]
-        print(",".join([str(relative_time)] + values), file=file)
-        
-        if msg_count % 1000 == 0:
-            print(f"  {relative_time:5.3f}s")
-        msg_count += 1
-    
-    # Close all CSV files
-    for file in file_map.values():
-        file.close()
+            if start_time is None:
+                start_time = time_sec
+            
+            relative_time = time_sec - start_time
+            writer.write(relative_time, values)
+            
+            next_tick -= 1
+            if not next_tick:
+                next_tick = PROGRESS_INTERVAL
+                sys.stdout.write(f"  {relative_time:5.3f}s\n")
     
     return len(file_map)
 
 
+def _is_compressed_bag(path):
+    """Check if a directory is a ROS bag recorded with file or message compression.
+    
+    Args:
+        path: Path to check.
+    
+    Returns:
+        True if the metadata.yaml of the directory names a compression format.
+    """
+    metadata = _read_bag_metadata(path)
+    return bool(metadata and metadata.get("compression_format"))
+
+
 def is_rosbag_dir(path):
     """Check if a directory is a ROS bag directory.
     
-    A directory is considered a ROS bag if it contains metadata.yaml and .db3 files.
+    A directory is considered a ROS bag if its metadata.yaml lists storage
+    files of a supported plugin (sqlite3 .db3 or .mcap files). The files
+    themselves are not listed, which saves a directory scan per directory.
+    Compressed bags cannot be opened by the sequential reader and do not count.
     
     Args:
         path: Path to check.
@@ -144,14 +961,13 @@ def is_rosbag_dir(path):
     Returns:
         True if the directory is a ROS bag, False otherwise.
     """
-    path = Path(path)
-    if not path.is_dir():
+    metadata = _read_bag_metadata(path)
+    if metadata is None:
         return False
     
-    has_metadata = (path / "metadata.yaml").exists()
-    has_db3 = any(path.glob("*.db3"))
-    
-    return has_metadata and has_db3
+    return (metadata.get("storage_identifier") in STORAGE_IDS
+            and bool(metadata.get("relative_file_paths"))
+            and not _is_compressed_bag(path))
 
 
 def find_rosbags(root_path):
@@ -163,15 +979,16 @@ def find_rosbags(root_path):
     Returns:
         List of Path objects pointing to ROS bag directories.
     """
-    root_path = Path(root_path)
     rosbags = []
     
     for dirpath, dirnames, filenames in os.walk(root_path):
-        dirpath = Path(dirpath)
         if is_rosbag_dir(dirpath):
-            rosbags.append(dirpath)
+            rosbags.append(Path(dirpath))
             # Don't search subdirectories of a rosbag
             dirnames.clear()
+        elif _is_compressed_bag(dirpath):
+            print(f"Warning: skipping compressed ROS bag {dirpath}", file=sys.stderr)
+            dirnames.clear()
     
     return sorted(rosbags)
 
@@ -180,32 +997,80 @@ def get_relative_structure(bag_path, root_path):
     """Get the relative path structure from root to bag.
     
     Args:
-        bag_path: Path to the ROS bag directory.
-        root_path: Root directory path.
+        bag_path: Path object pointing to the ROS bag directory.
+        root_path: Path object pointing to the root directory.
     
     Returns:
         Relative path from root to bag.
     """
-    return Path(bag_path).relative_to(Path(root_path))
+    return bag_path.relative_to(root_path)
 
 
-def process_single_bag(bag_path, output_path):
+def process_single_bag(bag_path, output_path, output_format="csv", fields=None, progress=True):
     """Process a single ROS bag file.
     
     Args:
         bag_path: Path to the ROS bag directory.
         output_path: Path where CSV files will be saved.
+        output_format: Output file format, 'csv' or 'parquet'.
+        fields: Dict mapping topic names to the set of field paths to write.
+        progress: Print the bag time while converting.
+    
+    Returns:
+        True if the bag was converted, False if the field selection does not
+        match its topics.
     """
     print(f"Processing: {bag_path}")
-    topic_count = dump_bag(str(bag_path), str(output_path))
-    print(f"  ✓ Created {topic_count} CSV file(s) in {output_path}\n")
+    try:
+        topic_count = dump_bag(str(bag_path), str(output_path), output_format, fields, progress)
+    except ValueError as error:
+        print(f"  Error: {bag_path}: {error}\n", file=sys.stderr)
+        return False
+    print(f"  ✓ Created {topic_count} {output_format.upper()} file(s) in {output_path}\n")
+    return True
+
+
+def process_bags(rosbags, root_path, csv_dir, jobs=1, output_format="csv", fields=None):
+    """Process several ROS bags, mirroring their structure under root_path into csv_dir.
+    
+    Bags are independent, so with jobs > 1 they are converted in parallel by a
+    pool of forked worker processes.
+    
+    Args:
+        rosbags: List of ROS bag directories.
+        root_path: Root directory the bags are located under.
+        csv_dir: Directory where the CSV folder structure is created.
+        jobs: Number of bags to process in parallel.
+        output_format: Output file format, 'csv' or 'parquet'.
+        fields: Dict mapping topic names to the set of field paths to write.
+    
+    Returns:
+        Number of bags that could not be converted.
+    """
+    parallel = jobs > 1 and len(rosbags) > 1
+    # Get relative path structure and create corresponding CSV output paths. Progress
+    # lines of parallel workers could not be told apart, so only sequential runs print them.
+    tasks = [(bag_path, csv_dir / get_relative_structure(bag_path, root_path),
+              output_format, fields, not parallel)
+             for bag_path in rosbags]
+    
+    if not parallel:
+        return sum(not process_single_bag(*task) for task in tasks)
+    
+    # Write the storage config before forking so all workers share one file
+    _get_sqlite_config_uri()
+    with multiprocessing.get_context("fork").Pool(min(jobs, len(tasks))) as pool:
+        return sum(not converted for converted in pool.starmap(process_single_bag, tasks))
 
 
-def process_structured_bags(input_root):
+def process_structured_bags(input_root, jobs=1, output_format="csv", fields=None):
     """Process ROS bags in a structured directory with ros2bag and csv folders.
     
     Args:
         input_root: Root directory containing ros2bag and csv folders.
+        jobs: Number of bags to process in parallel.
+        output_format: Output file format, 'csv' or 'parquet'.
+        fields: Dict mapping topic names to the set of field paths to write.
     """
     input_root = Path(input_root)
     ros2bag_dir = input_root / "ros2bag"
@@ -227,12 +1092,10 @@ def process_structured_bags(input_root):
     
     print(f"Found {len(rosbags)} ROS bag(s) to process\n")
     
-    for bag_path in rosbags:
-        # Get relative path structure and create corresponding CSV output path
-        rel_path = get_relative_structure(bag_path, ros2bag_dir)
-        output_path = csv_dir / rel_path
-        
-        process_single_bag(bag_path, output_path)
+    failed = process_bags(rosbags, ros2bag_dir, csv_dir, jobs, output_format, fields)
+    if failed:
+        print(f"Error: {failed} of {len(rosbags)} bag(s) could not be converted.", file=sys.stderr)
+        sys.exit(1)
     
     print(f"✓ All bags processed successfully!")
 
@@ -249,6 +1112,15 @@ Examples:
 
   # Process structured directory with ros2bag/ and csv/ folders
   %(prog)s /path/to/project
+
+  # Process bags one at a time instead of in parallel
+  %(prog)s /path/to/project --jobs 1
+
+  # Write Parquet files instead of CSV
+  %(prog)s /path/to/project --format parquet
+
+  # Only write the joint positions of /joint_states
+  %(prog)s /path/to/project --fields /joint_states:name,position
   
   The structured mode expects:
     project/
@@ -266,9 +1138,49 @@ Examples:
         'input',
         help='Path to a single ROS bag directory or root directory containing ros2bag folder'
     )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=min(MAX_DEFAULT_JOBS, os.cpu_count() or 1),
+        help=f'Number of bags to process in parallel (default: number of CPUs, at most '
+             f'{MAX_DEFAULT_JOBS}). Each job uses up to 256 MiB of SQLite page cache and '
+             f'memory-maps up to 4 GiB of its bag'
+    )
+    parser.add_argument(
+        '--format',
+        choices=sorted(_TOPIC_WRITERS),
+        default='csv',
+        help='Output file format (default: csv). Parquet output requires pyarrow'
+    )
+    parser.add_argument(
+        '--fields',
+        action='append',
+        default=[],
+        metavar='TOPIC:FIELD[,FIELD...]',
+        help='Only write the given fields of a topic, e.g. /imu:angular_velocity.z,linear_acceleration. '
+             'A field selects everything nested below it. Can be repeated'
+    )
     
     args = parser.parse_args()
     
+    if args.jobs < 1:
+        parser.error(f"--jobs must be at least 1, got {args.jobs}")
+    
+    fields = {}
+    for spec in args.fields:
+        topic, sep, names = spec.partition(':')
+        if not sep or not topic or not names:
+            parser.error(f"invalid --fields value '{spec}', expected TOPIC:FIELD[,FIELD...]")
+        topic = '/' + topic.lstrip('/')
+        names = names.split(',')
+        if not all(names):
+            parser.error(f"invalid --fields value '{spec}', empty field name")
+        fields[topic] = fields.get(topic, frozenset()) | set(names)
+    
+    if args.format == 'parquet' and pq is None:
+        print("Error: --format parquet requires pyarrow (pip install pyarrow).", file=sys.stderr)
+        sys.exit(1)
+    
     input_path = Path(args.input)
     
     if not input_path.exists():
@@ -282,10 +1194,11 @@ Examples:
     # Check if this is a single rosbag or structured directory
     if is_rosbag_dir(input_path):
         # Single ROS bag - output CSVs in the same directory
-        process_single_bag(input_path, input_path)
+        if not process_single_bag(input_path, input_path, args.format, fields):
+            sys.exit(1)
     elif (input_path / "ros2bag").exists():
         # Structured directory with ros2bag folder
-        process_structured_bags(input_path)
+        process_structured_bags(input_path, args.jobs, args.format, fields)
     else:
         # Check if input contains rosbags directly
         rosbags = find_rosbags(input_path)
@@ -296,16 +1209,17 @@ Examples:
             csv_dir = input_path / "csv"
             csv_dir.mkdir(exist_ok=True)
             
-            for bag_path in rosbags:
-                rel_path = get_relative_structure(bag_path, input_path)
-                output_path = csv_dir / rel_path
-                process_single_bag(bag_path, output_path)
+            failed = process_bags(rosbags, input_path, csv_dir, args.jobs, args.format, fields)
+            if failed:
+                print(f"Error: {failed} of {len(rosbags)} bag(s) could not be converted.",
+                      file=sys.stderr)
+                sys.exit(1)
             
             print(f"✓ All bags processed successfully!")
         else:
             print(f"Error: No ROS bags found in '{input_path}'", file=sys.stderr)
             print("Expected either:", file=sys.stderr)
-            print("  - A single ROS bag directory (with metadata.yaml and .db3 files)", file=sys.stderr)
+            print("  - A single ROS bag directory (with metadata.yaml and .db3 or .mcap files)", file=sys.stderr)
             print("  - A directory with a 'ros2bag' subdirectory", file=sys.stderr)
             print("  - A directory containing ROS bag subdirectories", file=sys.stderr)
             sys.exit(1)